@@ -1,26 +1,105 @@
+import hashlib
 import os
+import re
+import sqlite3
+import threading
 import uuid
-from datetime import datetime, date
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from functools import wraps
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, Response, abort, make_response, render_template, request, redirect, url_for, flash, jsonify, g, session, stream_with_context
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-from sqlalchemy import text
+from flask.json.provider import JSONProvider, DefaultJSONProvider
+from flask_caching import Cache
+import orjson
+from werkzeug.security import check_password_hash
+from sqlalchemy import text, func, case, and_, event, delete, insert, select, update, inspect as sa_inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+
+try:
+    import fcntl
+except ImportError:  # Windows: uploads are only locked within the process
+    fcntl = None
 
 from config import Config
 from models import db, User, Stats, Announcement, Attendance, ActivityLog, Notification
+
+
+class ORJSONProvider(JSONProvider):
+    """jsonify() through orjson: C serializer with native date/datetime output."""
+
+    def dumps(self, obj, **kwargs):
+        # types orjson doesn't know (Decimal, __html__) use Flask's default hook
+        return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC, default=DefaultJSONProvider.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.config.from_object(Config)
 
+# server-side sessions in Redis when configured; otherwise Flask's signed cookie
+if app.config.get("REDIS_URL"):
+    import redis
+    from flask_session import Session
+
+    app.config.update(
+        SESSION_TYPE="redis",
+        SESSION_REDIS=redis.from_url(app.config["REDIS_URL"]),
+        SESSION_PERMANENT=False,
+    )
+    Session(app)
+
 # ensure upload folder exists
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "static", "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_DIR
+# uploads are staged outside static/ so partial files are never served; keep it
+# on the same filesystem as UPLOAD_FOLDER so moving a file into place is a rename
+UPLOAD_STAGING_DIR = os.path.join(app.instance_path, "uploads-tmp")
+os.makedirs(UPLOAD_STAGING_DIR, exist_ok=True)
+app.config["UPLOAD_STAGING_FOLDER"] = UPLOAD_STAGING_DIR
+
+
+@app.after_request
+def _cache_uploads(response):
+    # uploads are named by content hash, so a URL never changes meaning:
+    # browsers and any CDN in front may keep them for good
+    if request.endpoint == "static" and response.status_code == 200 \
+            and (request.view_args or {}).get("filename", "").startswith("uploads/"):
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    return response
 
 # database initialization
 db.init_app(app)
 
+
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_conn, connection_record):
+    # local SQLite only: WAL lets reads run alongside a write, and NORMAL sync
+    # drops the extra fsync on every commit (still safe with WAL); reads go
+    # through a 256 MB memory map and sort/temp tables stay in RAM
+    if isinstance(dbapi_conn, sqlite3.Connection):
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA mmap_size=268435456")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.close()
+
+
+# cache for read-heavy aggregates (leaderboard, report, latest announcement)
+cache = Cache(app)
+
 # Login Manager
 login_manager = LoginManager()
 login_manager.login_view = "login"
@@ -28,21 +107,155 @@ login_manager.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    # cache per request; g is reset for every request so nothing goes stale
+    uid = int(user_id)
+    users = getattr(g, "_user_cache", None)
+    if users is None:
+        users = g._user_cache = {}
+    if uid not in users:
+        users[uid] = db.session.get(User, uid)
+    return users[uid]
+
+
+# Password hashing: argon2id for new hashes. Older accounts still carry werkzeug
+# pbkdf2/scrypt hashes; those keep verifying and get upgraded on next login.
+ph = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=1)
+
+
+def hash_password(password):
+    return ph.hash(password)
+
+
+def verify_password(stored, password):
+    """Check a password against an argon2 hash or a legacy werkzeug hash."""
+    if not stored:
+        return False
+    if stored.startswith("$argon2"):
+        try:
+            return ph.verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    return check_password_hash(stored, password)
+
+
+# verified against when the username is unknown, so login takes the same time
+# whether or not the account exists
+DUMMY_HASH = ph.hash(os.urandom(16).hex())
+
+
+def password_needs_rehash(stored):
+    if not stored.startswith("$argon2"):
+        return True
+    return ph.check_needs_rehash(stored)
+
+
+def role_required(*roles):
+    """403 unless current_user has one of roles; place below @login_required."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if current_user.role not in roles:
+                abort(403)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# small in-process pool for writes that shouldn't hold up the response
+_background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tw-bg")
+
+
+def _write_activity(username, user_id, action):
+    # runs on a worker thread, so it needs its own app context and session
+    with app.app_context():
+        try:
+            db.session.add(ActivityLog(username=username, user_id=user_id, action=action))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
 
 
 def log_activity(username, user_id, action):
-    """Log login, logout, or attendance_mark for activity log."""
-    try:
-        db.session.add(ActivityLog(username=username, user_id=user_id, action=action))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
+    """Log login, logout, or attendance_mark for activity log (in the background)."""
+    _background.submit(_write_activity, username, user_id, action)
+
+
+def insert_ignore_duplicates(model):
+    """INSERT ... ON CONFLICT DO NOTHING on Postgres or SQLite."""
+    dialect = postgresql if db.engine.dialect.name == "postgresql" else sqlite
+    return dialect.insert(model).on_conflict_do_nothing()
+
+
+def invalidate_stats_cache():
+    """Drop cached aggregates after match records or player details change."""
+    cache.delete_memoized(leaderboard_board)
+    cache.delete_memoized(report_rows)
+    cache.delete("stats_version")
+
+
+def invalidate_announcements():
+    """Drop cached announcement reads after one is added, toggled or deleted."""
+    cache.delete_memoized(get_latest_announcement)
+    cache.delete_memoized(announcement_rows)
+    cache.delete("announcement_version")
+
+
+def stats_etag(version_key="stats_version"):
+    """ETag for a page built from the stats aggregates (or another cached set).
+
+    Covers the data version (replaced on every invalidate_stats_cache(), or
+    invalidate_announcements() for "announcement_version"), the URL with its
+    query string and the viewer, since pages render their nav.
+    """
+    version = cache.get(version_key)
+    if version is None:
+        version = uuid.uuid4().hex
+        # a per-process SimpleCache only sees this worker's invalidations, so
+        # there the version expires with the memoized data instead of lasting
+        shared = app.config["CACHE_TYPE"] != "SimpleCache"
+        cache.set(version_key, version, timeout=0 if shared else app.config["CACHE_DEFAULT_TIMEOUT"])
+    key = "%s|%s|%s" % (version, request.full_path, current_user.get_id())
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def not_modified(etag):
+    """A 304 when the client already holds this version, else None."""
+    # a pending flash message has to be rendered, so don't short-circuit then
+    if etag not in request.if_none_match or "_flashes" in session:
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def with_etag(response, etag, private=True):
+    response = make_response(response)
+    response.set_etag(etag)
+    # always revalidate; the ETag makes that a cheap 304
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+    return response
 
 
 # Create tables and default admin if no users exist
-with app.app_context():
+def init_db():
     db.create_all()
+    # EXISTS-style probe: stops at the first row instead of counting the table
+    if db.session.query(User.id).first() is None:
+        admin_user = os.environ.get("ADMIN_USERNAME", "TW_AIMED")
+        admin_pass = os.environ.get("ADMIN_PASSWORD", "admin123")
+        db.session.add(User(
+            username=admin_user,
+            password=hash_password(admin_pass),
+            role="admin"
+        ))
+        db.session.commit()
+
+
+# Bring databases created by older versions up to the current schema.
+# Only run from `flask init-db`, never on worker start.
+def migrate_db():
     # lightweight migrations for Stats / Announcement tables
     try:
         db.session.execute(text("ALTER TABLE stats ADD COLUMN match_type VARCHAR(20)"))
@@ -59,15 +272,80 @@ with app.app_context():
         db.session.commit()
     except Exception:
         db.session.rollback()
-    if User.query.count() == 0:
-        admin_user = os.environ.get("ADMIN_USERNAME", "TW_AIMED")
-        admin_pass = os.environ.get("ADMIN_PASSWORD", "admin123")
-        db.session.add(User(
-            username=admin_user,
-            password=generate_password_hash(admin_pass),
-            role="admin"
-        ))
+    # running totals on user; backfill from stats if the columns are new
+    totals_added = False
+    for column in PLAYER_TOTAL_COLUMNS:
+        try:
+            db.session.execute(text(f'ALTER TABLE "user" ADD COLUMN {column} INTEGER DEFAULT 0'))
+            db.session.commit()
+            totals_added = True
+        except Exception:
+            db.session.rollback()
+    if totals_added:
+        refresh_player_totals()
+        db.session.commit()
+    if not sa_inspect(db.engine).has_index("attendance", "ux_attendance_player_date"):
+        # older databases may hold repeat marks; keep the first one per day
+        first_ids = (
+            db.session.query(func.min(Attendance.id))
+            .group_by(Attendance.player_id, Attendance.date)
+            .scalar_subquery()
+        )
+        Attendance.query.filter(Attendance.id.not_in(first_ids)).delete(synchronize_session=False)
+        db.session.commit()
+    if db.engine.dialect.name == "postgresql":
+        # an index created before its INCLUDE columns were declared keeps its
+        # name, so create(checkfirst=True) would skip it; drop it to be rebuilt
+        inspector = sa_inspect(db.engine)
+        for table in db.metadata.sorted_tables:
+            existing = {found["name"]: found for found in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                wanted = set(index.dialect_options["postgresql"]["include"] or ())
+                found = existing.get(index.name)
+                if found is None:
+                    continue
+                has = set(found.get("dialect_options", {}).get("postgresql_include") or ())
+                if has != wanted:
+                    db.session.execute(text(f'DROP INDEX IF EXISTS "{index.name}"'))
         db.session.commit()
+    # indexes added after the tables were first created
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(db.engine, checkfirst=True)
+            except Exception:
+                pass
+    # indexes replaced by the ones above, or no longer queried
+    if sa_inspect(db.engine).has_index("attendance", "ux_attendance_player_date"):
+        db.session.execute(text("DROP INDEX IF EXISTS ix_attendance_player_date"))
+    db.session.execute(text("DROP INDEX IF EXISTS ix_activity_log_created_at"))
+    db.session.commit()
+
+
+def schema_is_current():
+    """True when every model column already exists (one inspector pass, no DDL)."""
+    inspector = sa_inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        if not {column.name for column in table.columns} <= existing:
+            return False
+    return True
+
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Create tables, apply lightweight migrations and the default admin."""
+    init_db()
+    migrate_db()
+    print("Database initialised.")
+
+
+@app.cli.command("backfill-totals")
+def backfill_totals_command():
+    """Recompute every player's running totals from the stats table."""
+    refresh_player_totals()
+    db.session.commit()
+    print("Player totals recomputed.")
 
 # ---------------- HOME ----------------
 @app.route("/")
@@ -85,13 +363,18 @@ def login():
     if request.method == "POST":
         username = (request.form.get("username") or "").strip()
         password = request.form.get("password") or ""
+        user = User.query.filter_by(username=username).first() if username else None
+
+        # CORRECT PASSWORD CHECK (always hash once, even for unknown/empty input)
+        valid = verify_password(user.password if user else DUMMY_HASH, password)
         if not username or not password:
             flash("Invalid username or password")
             return render_template("login.html")
-        user = User.query.filter_by(username=username).first()
 
-        # CORRECT PASSWORD CHECK
-        if user and user.active and check_password_hash(user.password, password):
+        if user is not None and user.active and valid:
+            if password_needs_rehash(user.password):
+                user.password = hash_password(password)
+                db.session.commit()
             login_user(user, remember=True)
             log_activity(user.username, user.id, "login")
             return redirect(url_for("dashboard"))
@@ -100,35 +383,39 @@ def login():
 
     return render_template("login.html")
 
-# ---------------- DASHBOARD ----------------
-@app.route("/dashboard")
-@login_required
-def dashboard():
-
+# ---------------- LATEST ANNOUNCEMENT (dashboard banner) ----------------
+@cache.memoize(60)
+def get_latest_announcement():
     # some older databases may not have the 'active' column on announcement yet
     try:
         latest = Announcement.query.filter_by(active=True).order_by(Announcement.id.desc()).first()
     except Exception:
+        db.session.rollback()
         latest = Announcement.query.order_by(Announcement.id.desc()).first()
+    if latest is None:
+        return None
+    return {"message": latest.message, "date": latest.date, "time": latest.time}
+
+
+# ---------------- DASHBOARD ----------------
+@app.route("/dashboard")
+@login_required
+def dashboard():
+
+    latest = get_latest_announcement()
     notifications = Notification.query.order_by(Notification.created_at.desc()).limit(10).all()
     # quick stats for the logged-in player
     user_stats = None
     if current_user.role == 'player':
-        recs = Stats.query.filter_by(player_id=current_user.id).all()
-        total_kills = sum((r.kills or 0) for r in recs)
-        total_matches = len(recs)
-        user_stats = {'kills': total_kills, 'matches': total_matches}
+        user_stats = {'kills': current_user.total_kills or 0, 'matches': current_user.matches_played or 0}
 
     return render_template("dashboard.html", user=current_user, note=latest, notifications=notifications, user_stats=user_stats)
 
 # ----------- ADD PLAYER (ADMIN ONLY) -----------
 @app.route("/add_player", methods=["GET","POST"])
 @login_required
+@role_required("admin")
 def add_player():
-
-    if current_user.role != "admin":
-        return "Access Denied"
-
     if request.method == "POST":
         username = (request.form.get("username") or "").strip()
         password = request.form.get("password") or ""
@@ -138,12 +425,11 @@ def add_player():
             flash("Username and password are required.")
             return redirect(url_for("add_player"))
         # CHECK USER EXISTS
-        existing_user = User.query.filter_by(username=username).first()
-        if existing_user:
+        if db.session.query(User.query.filter_by(username=username).exists()).scalar():
             flash("Username already exists! Try another.")
             return redirect(url_for("add_player"))
 
-        hashed_pw = generate_password_hash(password)
+        hashed_pw = hash_password(password)
 
         new_player = User(
             username=username,
@@ -155,6 +441,7 @@ def add_player():
 
         db.session.add(new_player)
         db.session.commit()
+        invalidate_stats_cache()
 
         flash("Player Created Successfully!")
         return redirect(url_for("add_player"))
@@ -164,19 +451,16 @@ def add_player():
 # ----------- MANAGE PLAYERS (ADMIN) -----------
 @app.route("/manage_players")
 @login_required
+@role_required("admin")
 def manage_players():
-    if current_user.role != "admin":
-        return "Access Denied"
     players = User.query.filter_by(role="player").all()  # include inactive accounts
     return render_template("manage_players.html", players=players)
 
 
 @app.route("/admin/edit_player/<int:player_id>", methods=["GET", "POST"])
 @login_required
+@role_required("admin")
 def admin_edit_player(player_id):
-    if current_user.role != "admin":
-        return "Access Denied", 403
-
     player = db.session.get(User, player_id)
     if not player or player.role not in ("player", "viewer"):
         flash("Player not found.")
@@ -196,6 +480,7 @@ def admin_edit_player(player_id):
         player.ff_uid = ff_uid
         player.player_role = player_role
         db.session.commit()
+        invalidate_stats_cache()
         flash(f"Updated {player.username}.")
         return redirect(url_for("manage_players"))
 
@@ -204,29 +489,24 @@ def admin_edit_player(player_id):
 
 @app.route("/delete_player_hard/<int:player_id>", methods=["POST"])
 @login_required
+@role_required("admin")
 def delete_player_hard(player_id):
     """Permanently delete a player and all related data."""
-    if current_user.role != "admin":
-        return "Access Denied", 403
-
     player = db.session.get(User, player_id)
     if not player or player.role not in ("player", "viewer"):
         flash("Player not found.")
         return redirect(url_for("manage_players"))
 
-    # delete all stats + screenshots for this player
-    stats = Stats.query.filter_by(player_id=player.id).all()
-    for stat in stats:
-        if stat.screenshot:
-            fpath = os.path.join(app.config["UPLOAD_FOLDER"], stat.screenshot)
-            if os.path.isfile(fpath):
-                try:
-                    os.remove(fpath)
-                except OSError:
-                    pass
-        db.session.delete(stat)
-
-    # remove attendance records and activity logs
+    # this player's screenshots; ones other records share (bulk uploads and
+    # identical images use one file) are kept by remove_unused_upload()
+    screenshots = db.session.scalars(
+        select(Stats.screenshot)
+        .where(Stats.player_id == player.id, Stats.screenshot.isnot(None))
+        .distinct()
+    ).all()
+
+    # delete all stats, attendance records and activity logs in bulk
+    db.session.execute(delete(Stats).where(Stats.player_id == player.id))
     Attendance.query.filter_by(player_id=player.id).delete()
     ActivityLog.query.filter_by(user_id=player.id).delete()
 
@@ -234,20 +514,25 @@ def delete_player_hard(player_id):
     username = player.username
     db.session.delete(player)
     db.session.commit()
+    invalidate_stats_cache()
+
+    # files go only once the rows referencing them are gone
+    for screenshot in screenshots:
+        remove_unused_upload(screenshot)
 
     flash(f"Player {username} permanently deleted with all records.")
     return redirect(url_for("manage_players"))
 
 @app.route("/delete_player/<int:player_id>")
 @login_required
+@role_required("admin")
 def delete_player(player_id):
-    if current_user.role != "admin":
-        return "Access Denied"
     player = db.session.get(User, player_id)
     if player and player.role == "player" and player.active:
         # soft-delete: mark inactive, leave stats
         player.active = False
         db.session.commit()
+        invalidate_stats_cache()
         flash(f"Player {player.username} deactivated.")
     else:
         flash("Player not found or already inactive.")
@@ -255,13 +540,13 @@ def delete_player(player_id):
 
 @app.route("/restore_player/<int:player_id>")
 @login_required
+@role_required("admin")
 def restore_player(player_id):
-    if current_user.role != "admin":
-        return "Access Denied"
     player = db.session.get(User, player_id)
     if player and player.role == "player" and not player.active:
         player.active = True
         db.session.commit()
+        invalidate_stats_cache()
         flash(f"Player {player.username} restored.")
     else:
         flash("Player not found or already active.")
@@ -269,13 +554,13 @@ def restore_player(player_id):
 
 @app.route("/toggle_role/<int:player_id>")
 @login_required
+@role_required("admin")
 def toggle_role(player_id):
-    if current_user.role != "admin":
-        return "Access Denied"
     player = db.session.get(User, player_id)
     if player and player.role in ["player", "viewer"]:
         player.role = "viewer" if player.role == "player" else "player"
         db.session.commit()
+        invalidate_stats_cache()
         flash(f"Player {player.username} role changed to {player.role}.")
     else:
         flash("Player not found or cannot change role.")
@@ -291,10 +576,141 @@ def logout():
 
 
 # helper for allowed screenshot types
-ALLOWED_EXT = {"png","jpg","jpeg","gif"}
+ALLOWED_EXT = frozenset({"png", "jpg", "jpeg", "gif"})
 
 def allowed_file(filename):
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXT
+    _, dot, ext = filename.rpartition(".")
+    return bool(dot) and ext.lower() in ALLOWED_EXT
+
+
+# magic numbers for png, jpeg and gif
+IMAGE_SIGNATURES = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff", b"GIF87a", b"GIF89a")
+
+
+def allowed_upload(file):
+    """Extension, declared content type and file signature."""
+    if not allowed_file(file.filename):
+        return False
+    # some clients send no specific type for files; only reject clear non-images
+    mimetype = file.mimetype or ""
+    if mimetype and mimetype != "application/octet-stream" and not mimetype.startswith("image/"):
+        return False
+    # the first bytes must really be one of the allowed image formats
+    head = file.stream.read(8)
+    file.stream.seek(0)
+    return head.startswith(IMAGE_SIGNATURES)
+
+
+UPLOAD_CHUNK = 1 << 20
+
+_upload_lock = threading.Lock()
+
+
+@contextmanager
+def upload_lock():
+    """Serialize moving uploads into place and removing them, across workers too."""
+    with _upload_lock, open(os.path.join(app.config["UPLOAD_STAGING_FOLDER"], ".lock"), "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        yield
+
+
+def stage_upload(file):
+    """Copy an upload to a staging .part file in 1 MiB chunks, hashing it on the way.
+
+    Returns the content-addressed name (sha256 of the data + extension) and
+    the .part path; store_upload() moves it into place once the row that
+    points at it is committed, and callers discard_upload() it on any failure
+    before that. Identical screenshots map to one file, which is why removal
+    goes through remove_unused_upload().
+    """
+    ext = file.filename.rpartition(".")[2].lower()
+    digest = hashlib.sha256()
+    partial = os.path.join(app.config["UPLOAD_STAGING_FOLDER"], "%s.part" % uuid.uuid4().hex)
+    try:
+        with open(partial, "wb") as dst:
+            while chunk := file.stream.read(UPLOAD_CHUNK):
+                digest.update(chunk)
+                dst.write(chunk)
+    except BaseException:
+        # disk errors, but also a client disconnecting mid-upload
+        discard_upload(partial)
+        raise
+    return digest.hexdigest() + "." + ext, partial
+
+
+def discard_upload(partial):
+    """Drop a staged .part file; one that is already gone is fine."""
+    try:
+        os.unlink(partial)
+    except OSError:
+        pass
+
+
+def store_upload(filename, partial):
+    """Move a staged upload into place, unless identical content is already stored.
+
+    Runs after the commit. Returns False when the file could not be stored;
+    the records pointing at it then get their screenshot cleared, so none is
+    left referencing a missing file.
+    """
+    filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+    with upload_lock():
+        if os.path.exists(filepath):
+            discard_upload(partial)
+            return True
+        try:
+            os.replace(partial, filepath)
+            return True
+        except OSError:
+            app.logger.exception("Could not save upload %s", filepath)
+            discard_upload(partial)
+        db.session.execute(
+            update(Stats)
+            .where(Stats.screenshot == filename)
+            .values(screenshot=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    return False
+
+
+def remove_unused_upload(filename):
+    """Delete a stored screenshot once no committed record references it.
+
+    Call after the commit that dropped the reference. The count is taken under
+    the same lock store_upload() uses, so an identical upload committed
+    meanwhile keeps the file.
+    """
+    with upload_lock():
+        if db.session.query(Stats.id).filter(Stats.screenshot == filename).first() is not None:
+            return
+        try:
+            os.unlink(os.path.join(app.config["UPLOAD_FOLDER"], filename))
+        except OSError:
+            pass
+
+
+def parse_iso_date(value):
+    """YYYY-MM-DD string to a date, or None when empty or malformed."""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+INT_RE = re.compile(r"[+-]?\d+")
+
+
+def parse_int(value, default=0):
+    """Form value to an int, or default when missing or not a whole number."""
+    if value is None:
+        return default
+    value = str(value).strip()
+    # a regex check is cheaper than letting int() raise on junk
+    return int(value) if INT_RE.fullmatch(value) else default
 
 
 # position → tournament points mapping
@@ -314,30 +730,167 @@ POSITION_POINTS = {
 }
 
 
-def position_to_points(pos):
-    try:
-        pos_int = int(pos) if pos is not None else 0
-    except (TypeError, ValueError):
-        pos_int = 0
-    # fallback for legacy rows that only have booyah: treat any win as top placement
-    return POSITION_POINTS.get(pos_int, 0)
+# match types a record can have
+MATCH_TYPES = frozenset({"BR", "CS", "Scrims", "Custom"})
+
+# ?type= values accepted by the leaderboard / team pages
+BOARD_TYPES = {
+    "br": "BR",
+    "cs": "CS",
+    "scrims": "Scrims",
+    "custom": "Custom",
+    "all": "overall",
+    "overall": "overall",
+    "": "overall",
+}
+
+
+# per-row scoring rules as SQL, for aggregate queries.
+# legacy rows may not have position; treat booyah>0 as a win worth top placement
+WIN_SQL = case(
+    (Stats.position == 1, 1),
+    (and_(Stats.position.is_(None), Stats.booyah > 0), 1),
+    else_=0,
+)
+POSITION_POINTS_SQL = case(
+    (Stats.position.is_(None), 12 * func.coalesce(Stats.booyah, 0)),
+    else_=case(POSITION_POINTS, value=Stats.position, else_=0),
+)
+
+
+# denormalized per-player totals on User, in refresh_player_totals() order
+PLAYER_TOTAL_COLUMNS = (
+    "matches_played",
+    "total_kills",
+    "total_booyah",
+    "total_position_points",
+    "total_damage",
+    "total_survival",
+)
+
+
+def refresh_player_totals(user_ids=None):
+    """Recompute User running totals from Stats (every user when user_ids is None)."""
+    q = db.session.query(
+        Stats.player_id,
+        func.count(Stats.id),
+        func.coalesce(func.sum(Stats.kills), 0),
+        func.coalesce(func.sum(WIN_SQL), 0),
+        func.coalesce(func.sum(POSITION_POINTS_SQL), 0),
+        func.coalesce(func.sum(Stats.damage), 0),
+        func.coalesce(func.sum(Stats.survival), 0),
+    ).group_by(Stats.player_id)
+    users = User.query
+    if user_ids is not None:
+        q = q.filter(Stats.player_id.in_(user_ids))
+        users = users.filter(User.id.in_(user_ids))
+
+    totals = {row[0]: row[1:] for row in q}
+    for user in users:
+        values = totals.get(user.id, (0,) * len(PLAYER_TOTAL_COLUMNS))
+        for column, value in zip(PLAYER_TOTAL_COLUMNS, values):
+            setattr(user, column, value)
+
+
+def match_sums(matches):
+    """(kills, wins, position points, damage, survival) summed over match tuples.
+
+    matches holds (kills, position, booyah, damage, survival) tuples; wins and
+    points follow WIN_SQL / POSITION_POINTS_SQL.
+    """
+    kills = wins = points = damage = survival = 0
+    for m_kills, position, booyah, m_damage, m_survival in matches:
+        kills += m_kills or 0
+        damage += m_damage or 0
+        survival += m_survival or 0
+        if position == 1 or (position is None and (booyah or 0) > 0):
+            wins += 1
+        # same rule as POSITION_POINTS_SQL; positions are ints from the form/DB
+        points += POSITION_POINTS.get(position, 0) if position is not None else 12 * (booyah or 0)
+    return kills, wins, points, damage, survival
+
+
+def record_matches(user_id, matches):
+    """Fold new matches into the player's best records and running totals.
+
+    matches holds (kills, position, booyah, damage, survival) tuples. It is a
+    single UPDATE computed in the database, so concurrent submissions for the
+    same player can't overwrite each other.
+    """
+    top_kills = max((m[0] or 0 for m in matches), default=0)
+    top_damage = max((m[3] or 0 for m in matches), default=0)
+    kills, wins, points, damage, survival = match_sums(matches)
+
+    best_kills = func.coalesce(User.best_kills, 0)
+    best_damage = func.coalesce(User.best_damage, 0)
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            best_kills=case((best_kills < top_kills, top_kills), else_=best_kills),
+            best_damage=case((best_damage < top_damage, top_damage), else_=best_damage),
+            matches_played=func.coalesce(User.matches_played, 0) + len(matches),
+            total_kills=func.coalesce(User.total_kills, 0) + kills,
+            total_booyah=func.coalesce(User.total_booyah, 0) + wins,
+            total_position_points=func.coalesce(User.total_position_points, 0) + points,
+            total_damage=func.coalesce(User.total_damage, 0) + damage,
+            total_survival=func.coalesce(User.total_survival, 0) + survival,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def record_match(user_id, kills, position, booyah, damage, survival):
+    """record_matches() for a single match."""
+    record_matches(user_id, [(kills, position, booyah, damage, survival)])
+
+
+def adjust_player_totals(user_id, old_match, new_match):
+    """Shift running totals by an edited match's old -> new difference (one UPDATE)."""
+    delta = [new - old for old, new in zip(match_sums([old_match]), match_sums([new_match]))]
+    values = {
+        column: func.coalesce(getattr(User, column), 0) + change
+        for column, change in zip(PLAYER_TOTAL_COLUMNS[1:], delta)
+        if change
+    }
+    if values:
+        db.session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def refresh_best_records(user_id):
+    """Recompute best kills/damage from the player's Stats rows in one UPDATE."""
+    def best(column):
+        return (
+            select(func.coalesce(func.max(column), 0))
+            .where(Stats.player_id == User.id)
+            .scalar_subquery()
+        )
+
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(best_kills=best(Stats.kills), best_damage=best(Stats.damage))
+        .execution_options(synchronize_session=False)
+    )
+
 
 # ----------- ADD STATS -----------
 @app.route("/add_stats", methods=["GET","POST"])
 @login_required
+@role_required("admin", "player")
 def add_stats():
-
-    if current_user.role == "viewer":
-        return "Access Denied"
-
     if request.method == "POST":
         date_str = request.form.get("date")
         if not date_str:
             flash("Please select a date.")
             return redirect(url_for("add_stats"))
-        try:
-            match_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        except ValueError:
+        match_date = parse_iso_date(date_str)
+        if match_date is None:
             flash("Invalid date format.")
             return redirect(url_for("add_stats"))
         kills = int(request.form.get("kills", 0))
@@ -351,8 +904,7 @@ def add_stats():
         damage = int(request.form.get("damage", 0))
         survival = int(request.form.get("survival", 0))
         match_type = (request.form.get("match_type") or "").strip()
-        allowed_types = {"BR", "CS", "Scrims", "Custom"}
-        if match_type and match_type not in allowed_types:
+        if match_type and match_type not in MATCH_TYPES:
             match_type = None
 
         # screenshot upload
@@ -360,36 +912,45 @@ def add_stats():
         if not file or file.filename == "":
             flash("Please select a screenshot file.")
             return redirect(url_for("add_stats"))
-        if not allowed_file(file.filename):
+        if not allowed_upload(file):
             flash("Invalid file type. Allowed: png, jpg, jpeg, gif.")
             return redirect(url_for("add_stats"))
-        filename = str(uuid.uuid4()) + "_" + secure_filename(file.filename)
-        filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        file.save(filepath)
+        # written before anything is committed, so a failed write fails the request
+        try:
+            filename, partial = stage_upload(file)
+        except OSError:
+            app.logger.exception("Could not stage upload")
+            flash("Could not save the screenshot, please try again.")
+            return redirect(url_for("add_stats"))
 
-        new_record = Stats(
-            player_id=current_user.id,
-            date=match_date,
-            kills=kills,
-            booyah=booyah,
-            position=position,
-            damage=damage,
-            survival=survival,
-            screenshot=filename,
-            match_type=match_type
-        )
+        try:
+            new_record = Stats(
+                player_id=current_user.id,
+                date=match_date,
+                kills=kills,
+                booyah=booyah,
+                position=position,
+                damage=damage,
+                survival=survival,
+                screenshot=filename,
+                match_type=match_type
+            )
 
-        db.session.add(new_record)
+            db.session.add(new_record)
 
-        # BEST RECORD AUTO UPDATE
-        if kills > current_user.best_kills:
-            current_user.best_kills = kills
-        if damage > current_user.best_damage:
-            current_user.best_damage = damage
+            # BEST RECORD AUTO UPDATE (and running totals)
+            record_match(current_user.id, kills, position, booyah, damage, survival)
 
-        db.session.commit()
-
-        flash("Match record uploaded!")
+            db.session.commit()
+        except BaseException:
+            discard_upload(partial)
+            raise
+        invalidate_stats_cache()
+        # the file goes live once the row pointing at it is committed
+        if store_upload(filename, partial):
+            flash("Match record uploaded!")
+        else:
+            flash("Match record saved, but the screenshot could not be stored.")
 
         return redirect(url_for("dashboard"))
 
@@ -399,25 +960,20 @@ def add_stats():
 # ----------- BULK STATS UPLOAD (ADMIN ONLY) -----------
 @app.route("/admin/bulk_stats", methods=["GET", "POST"])
 @login_required
+@role_required("admin")
 def bulk_stats():
-
-    if current_user.role != "admin":
-        return "Access Denied", 403
-
     if request.method == "POST":
         date_str = request.form.get("date")
         if not date_str:
             flash("Please select a date.")
             return redirect(url_for("bulk_stats"))
-        try:
-            match_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        except ValueError:
+        match_date = parse_iso_date(date_str)
+        if match_date is None:
             flash("Invalid date format.")
             return redirect(url_for("bulk_stats"))
 
         match_type = (request.form.get("match_type") or "").strip()
-        allowed_types = {"BR", "CS", "Scrims", "Custom"}
-        if match_type and match_type not in allowed_types:
+        if match_type and match_type not in MATCH_TYPES:
             match_type = None
 
         # one screenshot used for all rows
@@ -425,12 +981,9 @@ def bulk_stats():
         if not file or file.filename == "":
             flash("Please select a screenshot file.")
             return redirect(url_for("bulk_stats"))
-        if not allowed_file(file.filename):
+        if not allowed_upload(file):
             flash("Invalid file type. Allowed: png, jpg, jpeg, gif.")
             return redirect(url_for("bulk_stats"))
-        filename = str(uuid.uuid4()) + "_" + secure_filename(file.filename)
-        filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        file.save(filepath)
 
         player_ids = request.form.getlist("player_id")
         kills_list = request.form.getlist("kills")
@@ -438,7 +991,8 @@ def bulk_stats():
         damages = request.form.getlist("damage")
         survivals = request.form.getlist("survival")
 
-        created_any = False
+        new_rows = []
+        per_player = {}
 
         for idx, pid in enumerate(player_ids):
             pid = (pid or "").strip()
@@ -449,63 +1003,61 @@ def bulk_stats():
             except ValueError:
                 continue
 
-            try:
-                kills_val = int(kills_list[idx]) if idx < len(kills_list) else 0
-            except (ValueError, TypeError):
-                kills_val = 0
-            try:
-                pos_val = int(positions[idx]) if idx < len(positions) else 0
-            except (ValueError, TypeError):
-                pos_val = 0
+            kills_val = parse_int(kills_list[idx]) if idx < len(kills_list) else 0
+            pos_val = parse_int(positions[idx]) if idx < len(positions) else 0
             if pos_val < 1 or pos_val > 12:
                 pos_val = 0
-            try:
-                damage_val = int(damages[idx]) if idx < len(damages) else 0
-            except (ValueError, TypeError):
-                damage_val = 0
-            try:
-                survival_val = int(survivals[idx]) if idx < len(survivals) else 0
-            except (ValueError, TypeError):
-                survival_val = 0
+            damage_val = parse_int(damages[idx]) if idx < len(damages) else 0
+            survival_val = parse_int(survivals[idx]) if idx < len(survivals) else 0
 
             booyah_val = 1 if pos_val == 1 else 0
 
-            new_record = Stats(
-                player_id=player_id,
-                date=match_date,
-                kills=kills_val,
-                booyah=booyah_val,
-                position=pos_val or None,
-                damage=damage_val,
-                survival=survival_val,
-                screenshot=filename,
-                match_type=match_type,
+            new_rows.append({
+                "player_id": player_id,
+                "date": match_date,
+                "kills": kills_val,
+                "booyah": booyah_val,
+                "position": pos_val or None,
+                "damage": damage_val,
+                "survival": survival_val,
+                "match_type": match_type,
+            })
+
+            per_player.setdefault(player_id, []).append(
+                (kills_val, pos_val or None, booyah_val, damage_val, survival_val)
             )
 
-            db.session.add(new_record)
-
-            # BEST RECORD AUTO UPDATE per player
-            player = db.session.get(User, player_id)
-            if player:
-                if kills_val > (player.best_kills or 0):
-                    player.best_kills = kills_val
-                if damage_val > (player.best_damage or 0):
-                    player.best_damage = damage_val
-
-            created_any = True
-
-        if not created_any:
-            # no valid rows, remove saved screenshot to avoid orphan file
-            if os.path.isfile(filepath):
-                try:
-                    os.remove(filepath)
-                except OSError:
-                    pass
+        if not new_rows:
+            # nothing to attach the screenshot to, so it is never written
             flash("No valid player rows submitted.")
             return redirect(url_for("bulk_stats"))
 
-        db.session.commit()
-        flash("Bulk match records uploaded!")
+        # written before anything is committed, so a failed write fails the request
+        try:
+            filename, partial = stage_upload(file)
+        except OSError:
+            app.logger.exception("Could not stage upload")
+            flash("Could not save the screenshot, please try again.")
+            return redirect(url_for("bulk_stats"))
+
+        try:
+            for row in new_rows:
+                row["screenshot"] = filename
+            # one executemany INSERT instead of a unit-of-work object per row
+            db.session.execute(insert(Stats), new_rows)
+            # BEST RECORD AUTO UPDATE: one UPDATE per player (no-op for unknown ids)
+            for player_id, matches in per_player.items():
+                record_matches(player_id, matches)
+
+            db.session.commit()
+        except BaseException:
+            discard_upload(partial)
+            raise
+        invalidate_stats_cache()
+        if store_upload(filename, partial):
+            flash("Bulk match records uploaded!")
+        else:
+            flash("Match records saved, but the screenshot could not be stored.")
         return redirect(url_for("bulk_stats"))
 
     # GET: load players list for dropdowns
@@ -515,50 +1067,78 @@ def bulk_stats():
 
 
 # ----------- LEADERBOARD -----------
-@app.route("/leaderboard")
-@login_required
-def leaderboard():
+def score_sql(kills, position_points, damage, survival):
+    """Leaderboard score as a SQL expression, matching the Python formula."""
+    return kills + position_points + damage / 1000.0 + survival * 0.2
+
+
+def typed_leaderboard_rows(match_type):
+    """Per-player leaderboard sums for one match type."""
+    join_on = and_(Stats.player_id == User.id, Stats.match_type == match_type)
+    kills = func.coalesce(func.sum(Stats.kills), 0)
+    points = func.coalesce(func.sum(POSITION_POINTS_SQL), 0)
+    damage = func.coalesce(func.sum(Stats.damage), 0)
+    survival = func.coalesce(func.sum(Stats.survival), 0)
+
+    # one GROUP BY over all active players instead of a Stats query per player
+    return (
+        db.session.query(
+            User.username,
+            User.ff_uid,
+            User.player_role,
+            kills,
+            func.coalesce(func.sum(WIN_SQL), 0),
+            points,
+            damage,
+            survival,
+        )
+        .outerjoin(Stats, join_on)
+        .filter(User.role == "player", User.active == True)
+        .group_by(User.id)
+        .order_by(score_sql(kills, points, damage, survival).desc(), User.id)
+        .all()
+    )
 
-    raw_type = (request.args.get("type") or "").strip().lower()
-    type_map = {
-        "br": "BR",
-        "cs": "CS",
-        "scrims": "Scrims",
-        "custom": "Custom",
-        "all": "overall",
-        "overall": "overall",
-        "": "overall",
-    }
-    match_type = type_map.get(raw_type, "overall")
 
-    players = User.query.filter_by(role="player", active=True).all()
+@cache.memoize(60)
+def leaderboard_board(match_type):
+    """Leaderboard rows for a match type ("overall" for all), best score first.
+
+    Shared by /leaderboard and the public /team page.
+    """
+    if match_type == "overall":
+        # all match types: read the running totals kept on User
+        kills = func.coalesce(User.total_kills, 0)
+        points = func.coalesce(User.total_position_points, 0)
+        damage = func.coalesce(User.total_damage, 0)
+        survival = func.coalesce(User.total_survival, 0)
+        rows = (
+            db.session.query(
+                User.username,
+                User.ff_uid,
+                User.player_role,
+                kills,
+                func.coalesce(User.total_booyah, 0),
+                points,
+                damage,
+                survival,
+            )
+            .filter(User.role == "player", User.active == True)
+            .order_by(score_sql(kills, points, damage, survival).desc(), User.id)
+            .all()
+        )
+    else:
+        rows = typed_leaderboard_rows(match_type)
 
     board = []
 
-    for p in players:
-        q = Stats.query.filter_by(player_id=p.id)
-        if match_type != "overall":
-            q = q.filter(Stats.match_type == match_type)
-        records = q.all()
-
-        total_kills = sum((r.kills or 0) for r in records)
-        # legacy rows may not have position; treat booyah>0 as a win
-        total_wins = sum(
-            1
-            for r in records
-            if (r.position == 1) or (r.position is None and (r.booyah or 0) > 0)
-        )
-        total_position_points = sum(
-            position_to_points(r.position) if r.position is not None else (12 * (r.booyah or 0))
-            for r in records
-        )
-        total_damage = sum((r.damage or 0) for r in records)
-        total_survival = sum((r.survival or 0) for r in records)
-
+    for username, ff_uid, player_role, total_kills, total_wins, total_position_points, total_damage, total_survival in rows:
         score = total_kills + total_position_points + (total_damage / 1000) + (total_survival * 0.2)
 
         board.append({
-            "name": p.username,
+            "name": username,
+            "ff_uid": ff_uid,
+            "player_role": player_role,
             "kills": total_kills,
             "booyah": total_wins,
             "position_points": total_position_points,
@@ -567,174 +1147,158 @@ def leaderboard():
             "score": round(score, 2)
         })
 
-    # sort by score descending
-    board = sorted(board, key=lambda x: x["score"], reverse=True)
+    # rows already arrive sorted by score descending
+    return board
 
-    return render_template("leaderboard.html", board=board, match_type=match_type)
+
+@app.route("/leaderboard")
+@login_required
+def leaderboard():
+
+    raw_type = (request.args.get("type") or "").strip().lower()
+    match_type = BOARD_TYPES.get(raw_type, "overall")
+
+    etag = stats_etag()
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    board = leaderboard_board(match_type)
+
+    return with_etag(render_template("leaderboard.html", board=board, match_type=match_type), etag)
 
 
 # ----------- PUBLIC TEAM ROSTER (NO LOGIN REQUIRED) -----------
 @app.route("/team")
 def public_team():
     raw_type = (request.args.get("type") or "").strip().lower()
-    type_map = {
-        "br": "BR",
-        "cs": "CS",
-        "scrims": "Scrims",
-        "custom": "Custom",
-        "all": "overall",
-        "overall": "overall",
-        "": "overall",
-    }
-    match_type = type_map.get(raw_type, "overall")
+    match_type = BOARD_TYPES.get(raw_type, "overall")
 
-    players = User.query.filter_by(role="player", active=True).all()
+    etag = stats_etag()
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
-    board = []
-    for p in players:
-        q = Stats.query.filter_by(player_id=p.id)
-        if match_type != "overall":
-            q = q.filter(Stats.match_type == match_type)
-        records = q.all()
-
-        total_kills = sum((r.kills or 0) for r in records)
-        total_wins = sum(
-            1
-            for r in records
-            if (r.position == 1) or (r.position is None and (r.booyah or 0) > 0)
+    # same cached aggregate as the leaderboard; invalidated on every stats write
+    board = leaderboard_board(match_type)
+
+    return with_etag(
+        render_template("public_team.html", board=board, match_type=match_type),
+        etag,
+        private=current_user.is_authenticated,
+    )
+
+
+# ----------- ANALYTICS REPORT API -----------
+def report_query(start_date=None, end_date=None, match_type=None):
+    """Per-player match count and totals, aggregated in a single query.
+
+    Filters go in the join condition so players without matching records are
+    still listed with zero matches.
+    """
+    if not (start_date or end_date or (match_type and match_type.lower() != "all")):
+        # unfiltered report: the running totals on User already hold the sums
+        return (
+            db.session.query(
+                User.username,
+                func.coalesce(User.matches_played, 0),
+                func.coalesce(User.total_kills, 0),
+                func.coalesce(User.total_damage, 0),
+                func.coalesce(User.total_booyah, 0),
+            )
+            .filter(User.role == "player", User.active == True)
+            .order_by(User.id)
         )
-        total_position_points = sum(
-            position_to_points(r.position) if r.position is not None else (12 * (r.booyah or 0))
-            for r in records
+
+    join_on = [Stats.player_id == User.id]
+    if match_type and match_type.lower() != "all":
+        join_on.append(Stats.match_type == match_type)
+    if start_date:
+        join_on.append(Stats.date >= start_date)
+    if end_date:
+        join_on.append(Stats.date <= end_date)
+
+    return (
+        db.session.query(
+            User.username,
+            func.count(Stats.id),
+            func.coalesce(func.sum(Stats.kills), 0),
+            func.coalesce(func.sum(Stats.damage), 0),
+            func.coalesce(func.sum(WIN_SQL), 0),
         )
-        total_damage = sum((r.damage or 0) for r in records)
-        total_survival = sum((r.survival or 0) for r in records)
+        .outerjoin(Stats, and_(*join_on))
+        .filter(User.role == "player", User.active == True)
+        .group_by(User.id)
+        .order_by(User.id)
+    )
 
-        score = total_kills + total_position_points + (total_damage / 1000) + (total_survival * 0.2)
 
-        board.append({
-            "name": p.username,
-            "ff_uid": p.ff_uid,
-            "player_role": p.player_role,
-            "kills": total_kills,
-            "booyah": total_wins,
-            "position_points": total_position_points,
-            "damage": total_damage,
-            "survival": total_survival,
-            "score": round(score, 2)
-        })
+def report_entry(row):
+    name, matches, total_kills, total_damage, total_wins = row
+
+    if matches > 0:
+        avg_kills = total_kills / matches
+        winrate = (total_wins / matches) * 100
+    else:
+        avg_kills = 0
+        winrate = 0
+
+    return {
+        "name": name,
+        "matches": matches,
+        "kills": total_kills,
+        "damage": total_damage,
+        "avg_kills": round(avg_kills, 2),
+        "winrate": round(winrate, 2)
+    }
 
-    board = sorted(board, key=lambda x: x["score"], reverse=True)
 
-    return render_template("public_team.html", board=board, match_type=match_type)
+@cache.memoize(60)
+def report_rows(start_date=None, end_date=None, match_type=None):
+    return [report_entry(row) for row in report_query(start_date, end_date, match_type)]
 
 
-# ----------- ANALYTICS REPORT API -----------
 @app.route("/api/report")
 @login_required
 def report_data():
     # optional date range filtering via query params (YYYY-MM-DD)
-    start = request.args.get('start')
-    end = request.args.get('end')
+    start_date = parse_iso_date(request.args.get('start'))
+    end_date = parse_iso_date(request.args.get('end'))
     match_type = request.args.get('type')
 
-    start_date = None
-    end_date = None
-    try:
-        start_date = datetime.strptime(start, "%Y-%m-%d").date() if start else None
-    except ValueError:
-        start_date = None
-    try:
-        end_date = datetime.strptime(end, "%Y-%m-%d").date() if end else None
-    except ValueError:
-        end_date = None
-
-    players = User.query.filter_by(role="player", active=True).all()
-    report = []
-
-    for p in players:
-        q = Stats.query.filter_by(player_id=p.id)
-        if match_type and match_type.lower() != "all":
-            q = q.filter(Stats.match_type == match_type)
-        if start_date:
-            q = q.filter(Stats.date >= start_date)
-        if end_date:
-            q = q.filter(Stats.date <= end_date)
-        records = q.all()
-
-        matches = len(records)
-        total_kills = sum((r.kills or 0) for r in records)
-        total_damage = sum((r.damage or 0) for r in records)
-        total_wins = sum(
-            1
-            for r in records
-            if (r.position == 1) or (r.position is None and (r.booyah or 0) > 0)
-        )
+    etag = stats_etag()
+    cached = not_modified(etag)
+    if cached:
+        return cached
 
-        if matches > 0:
-            avg_kills = total_kills / matches
-            winrate = (total_wins / matches) * 100
-        else:
-            avg_kills = 0
-            winrate = 0
+    report = report_rows(start_date, end_date, match_type)
 
-        report.append({
-            "name": p.username,
-            "matches": matches,
-            "kills": total_kills,
-            "damage": total_damage,
-            "avg_kills": round(avg_kills, 2),
-            "winrate": round(winrate, 2)
-        })
-
-    return jsonify(report)
+    return with_etag(jsonify(report), etag)
 
 # CSV export for report
 @app.route("/api/report/csv")
 @login_required
 def report_csv():
     # reuse report_data logic
-    players = User.query.filter_by(role="player", active=True).all()
-    start = request.args.get('start')
-    end = request.args.get('end')
+    start_date = parse_iso_date(request.args.get('start'))
+    end_date = parse_iso_date(request.args.get('end'))
     match_type = request.args.get('type')
-    start_date = None
-    end_date = None
-    try:
-        start_date = datetime.strptime(start, "%Y-%m-%d").date() if start else None
-    except ValueError:
-        start_date = None
-    try:
-        end_date = datetime.strptime(end, "%Y-%m-%d").date() if end else None
-    except ValueError:
-        end_date = None
     import csv
-    from io import StringIO
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["name","matches","kills","damage","avg_kills","winrate"])
-    for p in players:
-        q = Stats.query.filter_by(player_id=p.id)
-        if match_type and match_type.lower() != "all":
-            q = q.filter(Stats.match_type == match_type)
-        if start_date:
-            q = q.filter(Stats.date >= start_date)
-        if end_date:
-            q = q.filter(Stats.date <= end_date)
-        records = q.all()
-        matches = len(records)
-        total_kills = sum((r.kills or 0) for r in records)
-        total_damage = sum((r.damage or 0) for r in records)
-        total_wins = sum(
-            1
-            for r in records
-            if (r.position == 1) or (r.position is None and (r.booyah or 0) > 0)
-        )
-        avg_kills = total_kills / matches if matches > 0 else 0
-        winrate = (total_wins / matches) * 100 if matches > 0 else 0
-        writer.writerow([p.username, matches, total_kills, total_damage, round(avg_kills, 2), round(winrate, 2)])
-    output.seek(0)
-    return app.response_class(output.getvalue(), mimetype='text/csv', headers={
+
+    class Echo:
+        # csv.writer "file" that hands each formatted line straight back
+        def write(self, value):
+            return value
+
+    def generate():
+        # rows go out as the cursor yields them; nothing is buffered
+        writer = csv.writer(Echo())
+        yield writer.writerow(["name","matches","kills","damage","avg_kills","winrate"])
+        for row in report_query(start_date, end_date, match_type).yield_per(500):
+            e = report_entry(row)
+            yield writer.writerow([e["name"], e["matches"], e["kills"], e["damage"], e["avg_kills"], e["winrate"]])
+
+    return Response(stream_with_context(generate()), mimetype='text/csv', headers={
         'Content-Disposition':'attachment;filename=report.csv'
     })
 
@@ -750,22 +1314,28 @@ def graphs():
 @login_required
 def my_stats():
 
-    records = Stats.query.filter_by(player_id=current_user.id).order_by(Stats.id.desc()).all()
+    # derive booyah from position when available for consistency
+    booyah = case(
+        (Stats.position.is_(None), Stats.booyah),
+        (Stats.position == 1, 1),
+        else_=0,
+    )
+    rows = (
+        db.session.query(
+            Stats.date,
+            Stats.kills,
+            booyah.label("booyah"),
+            Stats.position,
+            Stats.damage,
+            Stats.survival,
+        )
+        .filter(Stats.player_id == current_user.id)
+        .order_by(Stats.id.desc())
+        .all()
+    )
 
-    data = []
-    for r in records:
-        # derive booyah from position when available for consistency
-        booyah_val = r.booyah
-        if r.position is not None:
-            booyah_val = 1 if r.position == 1 else 0
-        data.append({
-            "date": r.date.isoformat() if r.date else None,
-            "kills": r.kills,
-            "booyah": booyah_val,
-            "position": r.position,
-            "damage": r.damage,
-            "survival": r.survival
-        })
+    # orjson writes the date column as YYYY-MM-DD itself
+    data = [row._asdict() for row in rows]
 
     return jsonify(data)
 
@@ -780,16 +1350,10 @@ def player_profile(username):
     if not player:
         return "Player not found"
 
-    records = Stats.query.filter_by(player_id=player.id).all()
-
-    matches = len(records)
-    total_kills = sum((r.kills or 0) for r in records)
-    total_damage = sum((r.damage or 0) for r in records)
-    total_wins = sum(
-        1
-        for r in records
-        if (r.position == 1) or (r.position is None and (r.booyah or 0) > 0)
-    )
+    matches = player.matches_played or 0
+    total_kills = player.total_kills or 0
+    total_damage = player.total_damage or 0
+    total_wins = player.total_booyah or 0
 
     winrate = (total_wins / matches) * 100 if matches > 0 else 0
 
@@ -803,21 +1367,56 @@ def player_profile(username):
     )
 
 
+PAGE_SIZE = 50
+
+
+def page_cursor():
+    """?before and ?limit for keyset_page(), with limit clamped to 1..200."""
+    before = request.args.get("before", type=int)
+    limit = max(1, min(request.args.get("limit", PAGE_SIZE, type=int), 200))
+    return before, limit
+
+
+def keyset_page(query, id_column, row_id, cursor=None):
+    """Newest-first page of query below ?before=<id>, plus the cursor for the next page.
+
+    Filtering on the id instead of OFFSET keeps every page an index range scan.
+    cursor is a (before, limit) pair; default: page_cursor() of this request.
+    """
+    before, limit = cursor or page_cursor()
+    if before is not None:
+        query = query.filter(id_column < before)
+    rows = query.order_by(id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, row_id(rows[-1])
+
+
+@app.template_global()
+def older_page_url(before):
+    """This page's URL with ?before moved on; ?limit and other args are kept."""
+    args = request.args.to_dict()
+    args["before"] = before
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
 # ----------- MATCH PROOF GALLERY (ADMIN ONLY) -----------
 @app.route("/proofs")
 @login_required
+@role_required("admin")
 def proofs():
-    if current_user.role != "admin":
-        return "Access Denied"
-
-    records = Stats.query.order_by(Stats.id.desc()).all()
+    records, next_before = keyset_page(
+        db.session.query(Stats, User.username).outerjoin(User, User.id == Stats.player_id),
+        Stats.id,
+        lambda row: row[0].id,
+    )
 
     proof_list = []
-    for r in records:
-        player = db.session.get(User, r.player_id)
+    for r, username in records:
         proof_list.append({
             "id": r.id,
-            "player": player.username if player else "Unknown",
+            "player": username or "Unknown",
             "date": r.date,
             "kills": r.kills,
             "position": r.position,
@@ -826,41 +1425,29 @@ def proofs():
             "screenshot": r.screenshot
         })
 
-    return render_template("proofs.html", proofs=proof_list)
+    return render_template("proofs.html", proofs=proof_list, next_before=next_before)
 
 
 # ----------- DELETE PROOF (ADMIN) - removes stats entry and file -----------
 @app.route("/delete_proof/<int:stat_id>", methods=["POST"])
 @login_required
+@role_required("admin")
 def delete_proof(stat_id):
-    if current_user.role != "admin":
-        return "Access Denied", 403
     stat = db.session.get(Stats, stat_id)
     if not stat:
         flash("Proof not found.")
         return redirect(url_for("proofs"))
     player_id = stat.player_id
-    # remove file from disk if no other records share it
-    if stat.screenshot:
-        other_refs = Stats.query.filter(
-            Stats.screenshot == stat.screenshot,
-            Stats.id != stat.id
-        ).count()
-        if other_refs == 0:
-            fpath = os.path.join(app.config["UPLOAD_FOLDER"], stat.screenshot)
-            if os.path.isfile(fpath):
-                try:
-                    os.remove(fpath)
-                except OSError:
-                    pass
+    screenshot = stat.screenshot
     db.session.delete(stat)
-    # update user best_kills / best_damage from remaining stats (exclude this stat)
-    user = db.session.get(User, player_id)
-    if user:
-        remaining = Stats.query.filter(Stats.player_id == player_id, Stats.id != stat_id).all()
-        user.best_kills = max((r.kills for r in remaining), default=0)
-        user.best_damage = max((r.damage for r in remaining), default=0)
+    # update user best_kills / best_damage from remaining stats (the delete flushes first)
+    refresh_best_records(player_id)
+    refresh_player_totals([player_id])
     db.session.commit()
+    invalidate_stats_cache()
+    # remove file from disk if no other records share it
+    if screenshot:
+        remove_unused_upload(screenshot)
     flash("Proof and match record deleted.")
     return redirect(url_for("proofs"))
 
@@ -868,35 +1455,23 @@ def delete_proof(stat_id):
 # ----------- DELETE PROOF IMAGE (ADMIN) - removes stats entry + file from DB -----------
 @app.route("/delete_proof_image/<int:stat_id>", methods=["POST"])
 @login_required
+@role_required("admin")
 def delete_proof_image(stat_id):
-    if current_user.role != "admin":
-        return "Access Denied", 403
     stat = db.session.get(Stats, stat_id)
     if not stat:
         flash("Proof not found.")
         return redirect(url_for("proofs"))
     player_id = stat.player_id
-    # remove file from disk if no other records share it
-    if stat.screenshot:
-        other_refs = Stats.query.filter(
-            Stats.screenshot == stat.screenshot,
-            Stats.id != stat.id
-        ).count()
-        if other_refs == 0:
-            fpath = os.path.join(app.config["UPLOAD_FOLDER"], stat.screenshot)
-            if os.path.isfile(fpath):
-                try:
-                    os.remove(fpath)
-                except OSError:
-                    pass
+    screenshot = stat.screenshot
     db.session.delete(stat)
     # update user best_kills / best_damage from remaining stats
-    user = db.session.get(User, player_id)
-    if user:
-        remaining = Stats.query.filter(Stats.player_id == player_id, Stats.id != stat_id).all()
-        user.best_kills = max(((r.kills or 0) for r in remaining), default=0)
-        user.best_damage = max(((r.damage or 0) for r in remaining), default=0)
+    refresh_best_records(player_id)
+    refresh_player_totals([player_id])
     db.session.commit()
+    invalidate_stats_cache()
+    # remove file from disk if no other records share it
+    if screenshot:
+        remove_unused_upload(screenshot)
     flash("Proof and match record deleted from database.")
     return redirect(url_for("proofs"))
 
@@ -904,86 +1479,103 @@ def delete_proof_image(stat_id):
 # ----------- EDIT PROOF / MATCH RECORD (ADMIN) -----------
 @app.route("/edit_proof/<int:stat_id>", methods=["GET", "POST"])
 @login_required
+@role_required("admin")
 def edit_proof(stat_id):
-    if current_user.role != "admin":
-        return "Access Denied", 403
-    stat = db.session.get(Stats, stat_id)
-    if not stat:
+    # the record and its player in one round-trip
+    row = (
+        db.session.query(Stats, User)
+        .outerjoin(User, User.id == Stats.player_id)
+        .filter(Stats.id == stat_id)
+        .one_or_none()
+    )
+    if row is None:
         flash("Proof not found.")
         return redirect(url_for("proofs"))
 
-    player = db.session.get(User, stat.player_id) if stat.player_id else None
+    stat, player = row
 
     if request.method == "POST":
-        date_str = request.form.get("date") or ""
-        try:
-            stat.date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        except ValueError:
+        match_date = parse_iso_date(request.form.get("date"))
+        if match_date is None:
             flash("Invalid date format.")
             return redirect(url_for("edit_proof", stat_id=stat_id))
+        stat.date = match_date
+        old_match = (stat.kills, stat.position, stat.booyah, stat.damage, stat.survival)
 
-        try:
-            stat.kills = int(request.form.get("kills", stat.kills or 0))
-        except (TypeError, ValueError):
-            stat.kills = stat.kills or 0
-
-        try:
-            pos_val = int(request.form.get("position") or (stat.position or 0))
-        except (TypeError, ValueError):
-            pos_val = stat.position or 0
+        # missing or malformed fields keep the stored value
+        form = request.form
+        stat.kills = parse_int(form.get("kills"), stat.kills or 0)
+        pos_val = parse_int(form.get("position"), stat.position or 0)
         if pos_val < 1 or pos_val > 12:
             pos_val = 0
         stat.position = pos_val or None
         # keep booyah in sync
         stat.booyah = 1 if pos_val == 1 else 0
-
-        try:
-            stat.damage = int(request.form.get("damage", stat.damage or 0))
-        except (TypeError, ValueError):
-            stat.damage = stat.damage or 0
-        try:
-            stat.survival = int(request.form.get("survival", stat.survival or 0))
-        except (TypeError, ValueError):
-            stat.survival = stat.survival or 0
+        stat.damage = parse_int(form.get("damage"), stat.damage or 0)
+        stat.survival = parse_int(form.get("survival"), stat.survival or 0)
 
         match_type = (request.form.get("match_type") or "").strip()
-        allowed_types = {"BR", "CS", "Scrims", "Custom"}
-        if match_type and match_type not in allowed_types:
+        if match_type and match_type not in MATCH_TYPES:
             match_type = None
         stat.match_type = match_type
 
         # optional new screenshot
         file = request.files.get("screenshot")
+        new_upload = None
+        old_file = None
         if file and file.filename:
-            if not allowed_file(file.filename):
+            if not allowed_upload(file):
                 flash("Invalid file type. Allowed: png, jpg, jpeg, gif.")
                 return redirect(url_for("edit_proof", stat_id=stat_id))
-            # remove old file if present and not shared
-            if stat.screenshot:
-                other_refs = Stats.query.filter(
-                    Stats.screenshot == stat.screenshot,
-                    Stats.id != stat.id
-                ).count()
-                if other_refs == 0:
-                    old_path = os.path.join(app.config["UPLOAD_FOLDER"], stat.screenshot)
-                    if os.path.isfile(old_path):
-                        try:
-                            os.remove(old_path)
-                        except OSError:
-                            pass
-            new_name = str(uuid.uuid4()) + "_" + secure_filename(file.filename)
-            new_path = os.path.join(app.config["UPLOAD_FOLDER"], new_name)
-            file.save(new_path)
-            stat.screenshot = new_name
-
-        # update best stats for player
-        if player:
-            remaining = Stats.query.filter(Stats.player_id == player.id).all()
-            player.best_kills = max((r.kills for r in remaining), default=0)
-            player.best_damage = max((r.damage for r in remaining), default=0)
+            try:
+                new_upload = stage_upload(file)
+            except OSError:
+                app.logger.exception("Could not stage upload")
+                flash("Could not save the screenshot, please try again.")
+                return redirect(url_for("edit_proof", stat_id=stat_id))
+            # old file goes too if present and no longer referenced
+            if stat.screenshot != new_upload[0]:
+                old_file = stat.screenshot
+            stat.screenshot = new_upload[0]
 
-        db.session.commit()
-        flash("Match record updated.")
+        try:
+            # update best stats for player: a new or equal high is set directly;
+            # only lowering the record-holding match needs a MAX over the player's rows
+            if player:
+                rescan = False
+                for attr, old_val, new_val in (
+                    ("best_kills", old_match[0] or 0, stat.kills or 0),
+                    ("best_damage", old_match[3] or 0, stat.damage or 0),
+                ):
+                    best_val = getattr(player, attr) or 0
+                    if new_val >= best_val:
+                        setattr(player, attr, new_val)
+                    elif old_val >= best_val:
+                        rescan = True
+                if rescan:
+                    refresh_best_records(player.id)
+                # totals move by the difference; no re-aggregation of the player's rows
+                adjust_player_totals(
+                    player.id, old_match,
+                    (stat.kills, stat.position, stat.booyah, stat.damage, stat.survival),
+                )
+
+            db.session.commit()
+        except BaseException:
+            # the staged file must not outlive a request that didn't commit
+            if new_upload:
+                discard_upload(new_upload[1])
+            raise
+        invalidate_stats_cache()
+        # file work happens once the row points at the new name
+        stored = store_upload(*new_upload) if new_upload else True
+        if not stored and old_file:
+            # keep pointing at the previous screenshot rather than at none
+            stat.screenshot = old_file
+            db.session.commit()
+        elif old_file:
+            remove_unused_upload(old_file)
+        flash("Match record updated." if stored else "Match record updated, but the new screenshot could not be stored.")
         return redirect(url_for("proofs"))
 
     return render_template("edit_proof.html", stat=stat, player=player)
@@ -992,11 +1584,8 @@ def edit_proof(stat_id):
 # ----------- ANNOUNCEMENT ADD -----------
 @app.route("/announcement", methods=["GET","POST"])
 @login_required
+@role_required("admin")
 def announcement():
-
-    if current_user.role != "admin":
-        return "Access Denied"
-
     if request.method == "POST":
         message = (request.form.get("message") or "").strip()
         ann_date = request.form.get("date")
@@ -1015,40 +1604,102 @@ def announcement():
 
         db.session.add(new_note)
         db.session.commit()
+        invalidate_announcements()
 
         flash("Announcement posted.")
         return redirect(url_for("announcement"))
 
-    all_ann = Announcement.query.order_by(Announcement.id.desc()).all()
-    return render_template("announcement.html", announcements=all_ann)
+    etag = stats_etag("announcement_version")
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    all_ann, next_before = announcement_rows(*page_cursor())
+    html = render_template("announcement.html", announcements=all_ann, next_before=next_before)
+    return with_etag(html, etag)
+
+
+@cache.memoize(60)
+def announcement_rows(before, limit):
+    """One admin list page as plain dicts (cacheable), plus the next cursor."""
+    rows, next_before = keyset_page(Announcement.query, Announcement.id, lambda a: a.id, (before, limit))
+    return [
+        {"id": a.id, "message": a.message, "date": a.date, "time": a.time, "active": a.active}
+        for a in rows
+    ], next_before
+
+
+@app.route("/announcement/bulk", methods=["POST"])
+@login_required
+@role_required("admin")
+def announcement_bulk():
+    """Post many announcements at once: a JSON list or a CSV file of message,date,time."""
+    if request.is_json:
+        entries = request.get_json(silent=True)
+        if not isinstance(entries, list):
+            return jsonify({"error": "expected a JSON list"}), 400
+        entries = [e for e in entries if isinstance(e, dict)]
+    else:
+        import csv
+        import io
+
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            flash("Choose a CSV file to import.")
+            return redirect(url_for("announcement"))
+        text_stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", errors="replace")
+        entries = csv.DictReader(text_stream, fieldnames=["message", "date", "time"])
+
+    rows = []
+    for e in entries:
+        message = str(e.get("message") or "").strip()
+        # skip blanks and a "message,date,time" header line
+        if not message or message.lower() == "message":
+            continue
+        rows.append({
+            "message": message[:200],
+            "date": str(e.get("date") or "").strip()[:20] or None,
+            "time": str(e.get("time") or "").strip()[:20] or None,
+            "active": True,
+        })
+
+    if rows:
+        # one executemany INSERT and a single commit for the whole batch
+        db.session.execute(insert(Announcement), rows)
+        db.session.commit()
+        invalidate_announcements()
+
+    if request.is_json:
+        return jsonify({"added": len(rows)})
+    flash(f"{len(rows)} announcement(s) imported.")
+    return redirect(url_for("announcement"))
 
 
 @app.route("/announcement/toggle/<int:ann_id>", methods=["POST"])
 @login_required
+@role_required("admin")
 def announcement_toggle(ann_id):
-    if current_user.role != "admin":
-        return "Access Denied", 403
     ann = db.session.get(Announcement, ann_id)
     if not ann:
         flash("Announcement not found.")
         return redirect(url_for("announcement"))
     ann.active = not bool(ann.active)
     db.session.commit()
+    invalidate_announcements()
     flash("Announcement visibility updated.")
     return redirect(url_for("announcement"))
 
 
 @app.route("/announcement/delete/<int:ann_id>", methods=["POST"])
 @login_required
+@role_required("admin")
 def announcement_delete(ann_id):
-    if current_user.role != "admin":
-        return "Access Denied", 403
     ann = db.session.get(Announcement, ann_id)
     if not ann:
         flash("Announcement not found.")
         return redirect(url_for("announcement"))
     db.session.delete(ann)
     db.session.commit()
+    invalidate_announcements()
     flash("Announcement deleted.")
     return redirect(url_for("announcement"))
 
@@ -1060,45 +1711,57 @@ def announcement_delete(ann_id):
 @login_required
 def player_graph(username):
 
-    player = User.query.filter_by(username=username, role="player").first()
+    etag = stats_etag()
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
 
-    if not player:
-        return jsonify({})
+    player_id = db.session.query(User.id).filter_by(username=username, role="player").scalar()
 
-    records = Stats.query.filter_by(player_id=player.id).order_by(Stats.id).all()
+    if player_id is None:
+        return jsonify({})
 
-    dates = [r.date for r in records]
-    kills = [r.kills for r in records]
+    # just the two plotted columns, no Stats objects
+    rows = (
+        db.session.query(Stats.date, Stats.kills)
+        .filter(Stats.player_id == player_id)
+        .order_by(Stats.id)
+        .all()
+    )
 
-    return jsonify({
-        "dates": dates,
-        "kills": kills
+    response = jsonify({
+        "dates": [r.date for r in rows],
+        "kills": [r.kills for r in rows]
     })
+    # profile pages re-request this often; a minute of staleness is fine,
+    # after that the ETag makes the revalidation a 304
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = 60
+    return response
 
 
 
 # ----------- MARK ATTENDANCE -----------
 @app.route("/join_practice")
 @login_required
+@role_required("admin", "player")
 def join_practice():
-    if current_user.role == "viewer":
-        return "Access Denied"
-
     today = date.today()
 
-    # check already marked or not
-    existing = Attendance.query.filter_by(player_id=current_user.id, date=today).first()
-
-    if existing:
-        flash("You already joined today!")
-    else:
-        new_att = Attendance(
+    # the unique (player_id, date) index rejects repeat marks; no check-then-insert race
+    result = db.session.execute(
+        insert_ignore_duplicates(Attendance).values(
             player_id=current_user.id,
             date=today,
             status="Present"
         )
-        db.session.add(new_att)
-        db.session.commit()
+    )
+    db.session.commit()
+
+    if not result.rowcount:
+        flash("You already joined today!")
+    else:
         log_activity(current_user.username, current_user.id, "attendance_mark")
         flash("Attendance Marked Successfully!")
 
@@ -1107,42 +1770,38 @@ def join_practice():
 # ----------- VIEW ATTENDANCE (ADMIN) -----------
 @app.route("/attendance")
 @login_required
+@role_required("admin")
 def view_attendance():
+    # plain column rows; the template reads r.name / r.date / r.status directly
+    records, next_before = keyset_page(
+        db.session.query(
+            Attendance.id,
+            func.coalesce(User.username, "Unknown").label("name"),
+            Attendance.date,
+            Attendance.status,
+        ).outerjoin(User, User.id == Attendance.player_id),
+        Attendance.id,
+        lambda row: row.id,
+    )
 
-    if current_user.role != "admin":
-        return "Access Denied"
-
-    records = Attendance.query.all()
-
-    data = []
-    for r in records:
-        player = db.session.get(User, r.player_id)
-        data.append({
-            "name": player.username if player else "Unknown",
-            "date": r.date,
-            "status": r.status
-        })
-
-    return render_template("attendance.html", records=data)
+    return render_template("attendance.html", records=records, next_before=next_before)
 
 
 # ----------- ACTIVITY LOG (ADMIN ONLY) -----------
 @app.route("/activity_log")
 @login_required
+@role_required("admin")
 def activity_log():
-    if current_user.role != "admin":
-        flash("Access denied.")
-        return redirect(url_for("dashboard"))
-    logs = ActivityLog.query.order_by(ActivityLog.created_at.desc()).limit(200).all()
-    return render_template("activity_log.html", logs=logs)
+    # newest first by id (ids follow insert order, same as created_at)
+    logs, next_before = keyset_page(ActivityLog.query, ActivityLog.id, lambda log: log.id)
+    return render_template("activity_log.html", logs=logs, next_before=next_before)
 
 
 # ----------- RESET PLAYER PASSWORD (ADMIN) -----------
 @app.route("/reset_password/<int:player_id>", methods=["GET", "POST"])
 @login_required
+@role_required("admin")
 def reset_password(player_id):
-    if current_user.role != "admin":
-        return "Access Denied", 403
     player = db.session.get(User, player_id)
     if not player or player.role not in ("player", "viewer"):
         flash("Player not found.")
@@ -1157,7 +1816,7 @@ def reset_password(player_id):
         if not new_pass:
             flash("Enter a password or use Generate random.")
             return render_template("reset_password.html", player=player)
-        player.password = generate_password_hash(new_pass)
+        player.password = hash_password(new_pass)
         db.session.commit()
         flash(f"Password reset for {player.username}. New password: {new_pass}" if use_random else f"Password reset for {player.username}.")
         return redirect(url_for("manage_players"))
@@ -1167,9 +1826,8 @@ def reset_password(player_id):
 # ----------- NOTIFICATIONS (ADMIN add/delete, show on dashboard) -----------
 @app.route("/notification/add", methods=["POST"])
 @login_required
+@role_required("admin")
 def notification_add():
-    if current_user.role != "admin":
-        return "Access Denied", 403
     msg = (request.form.get("message") or "").strip()
     if not msg:
         flash("Notification message is required.")
@@ -1182,9 +1840,8 @@ def notification_add():
 
 @app.route("/notification/delete/<int:nid>", methods=["POST"])
 @login_required
+@role_required("admin")
 def notification_delete(nid):
-    if current_user.role != "admin":
-        return "Access Denied", 403
     n = db.session.get(Notification, nid)
     if n:
         db.session.delete(n)
@@ -1203,6 +1860,7 @@ def edit_profile():
         current_user.ff_uid = ff_uid
         current_user.player_role = player_role
         db.session.commit()
+        invalidate_stats_cache()
         flash("Profile updated")
         return redirect(url_for("dashboard"))
     return render_template("edit_profile.html", user=current_user)
@@ -1211,11 +1869,8 @@ def edit_profile():
 # ----------- CHANGE PASSWORD (ADMIN ONLY) -----------
 @app.route("/change_password", methods=["GET","POST"])
 @login_required
+@role_required("admin")
 def change_password():
-    if current_user.role != "admin":
-        flash("Only admin can change password.")
-        return redirect(url_for("dashboard"))
-
     if request.method == "POST":
         old_pass = request.form.get("old_password") or ""
         new_pass = request.form.get("new_password") or ""
@@ -1223,9 +1878,9 @@ def change_password():
             flash("Please fill all password fields.")
             return render_template("change_password.html")
         # verify old password
-        if check_password_hash(current_user.password, old_pass):
+        if verify_password(current_user.password, old_pass):
 
-            current_user.password = generate_password_hash(new_pass)
+            current_user.password = hash_password(new_pass)
             db.session.commit()
             flash("Password changed successfully!")
 
@@ -1236,6 +1891,25 @@ def change_password():
     return render_template("change_password.html")
 
 
+def _precompile_templates():
+    # compile every page template at startup instead of on its first request
+    for template_name in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(template_name)
+
+
+_precompile_templates()
+
+
+# create missing tables on import unless disabled (AUTO_INIT_DB=0). Schema
+# upgrades belong to `flask init-db` (run on deploy); as a fallback a database
+# still missing model columns is migrated here, since every query would fail
+if app.config["AUTO_INIT_DB"]:
+    with app.app_context():
+        init_db()
+        if not schema_is_current():
+            migrate_db()
+
+
 # Show detailed traceback on 500 errors (helps debug; remove in production)
 @app.errorhandler(500)
 def handle_500(err):
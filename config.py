@@ -15,5 +15,36 @@ class Config:
 
     SQLALCHEMY_DATABASE_URI = _db_url or ("sqlite:///" + os.path.join(BASE_DIR, "esports.db"))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {"pool_pre_ping": True}
+    # DB_POOL_PRE_PING=0 skips the per-checkout ping (e.g. behind pgbouncer)
+    SQLALCHEMY_ENGINE_OPTIONS = {"pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "1") != "0"}
+    if _db_url and not _db_url.startswith("sqlite"):
+        # server databases, per worker process: keep
+        # (DB_POOL_SIZE + DB_MAX_OVERFLOW) * workers under max_connections
+        SQLALCHEMY_ENGINE_OPTIONS.update(
+            pool_size=int(os.environ.get("DB_POOL_SIZE", 20)),
+            max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 40)),
+            pool_timeout=30,
+            # recycle before typical server/proxy idle timeouts drop the socket
+            pool_recycle=1800,
+            # reuse the most recently returned connection; idle extras age out
+            pool_use_lifo=True,
+        )
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024
+    # browser/CDN lifetime for /static css, js and images (uploads get their own)
+    SEND_FILE_MAX_AGE_DEFAULT = int(os.environ.get("STATIC_MAX_AGE", 3600))
+    # USE_X_SENDFILE=1 behind Apache/lighttpd mod_xsendfile: static and
+    # upload responses carry the file path and the server sends the bytes
+    USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "0") == "1"
+
+    # create tables / default admin on import; set AUTO_INIT_DB=0 and run
+    # `flask --app app init-db` once per deploy to keep it off worker boot
+    AUTO_INIT_DB = os.environ.get("AUTO_INIT_DB", "1") != "0"
+
+    # optional Redis (e.g. redis://localhost:6379/0); enables server-side sessions
+    REDIS_URL = os.environ.get("REDIS_URL")
+
+    # Flask-Caching: shared Redis cache when available, per-process memory otherwise
+    CACHE_TYPE = "RedisCache" if REDIS_URL else "SimpleCache"
+    CACHE_REDIS_URL = REDIS_URL
+    CACHE_DEFAULT_TIMEOUT = 60
+    CACHE_KEY_PREFIX = "tw_"
@@ -20,6 +20,32 @@ class User(UserMixin, db.Model):
     # account active? soft-delete support
     active = db.Column(db.Boolean, default=True)
 
+    # running totals over this player's Stats rows, kept up to date by the
+    # write paths so the overall leaderboard/report read them without a GROUP BY
+    matches_played = db.Column(db.Integer, default=0)
+    total_kills = db.Column(db.Integer, default=0)
+    total_booyah = db.Column(db.Integer, default=0)   # wins
+    total_position_points = db.Column(db.Integer, default=0)
+    total_damage = db.Column(db.Integer, default=0)
+    total_survival = db.Column(db.Integer, default=0)
+
+    # match records; loaded only on access or when a query asks for
+    # selectinload(User.stats) - hot paths use SQL aggregates instead
+    stats = db.relationship("Stats", back_populates="player", lazy="select")
+
+    # leaderboard / team / report all filter on role='player' AND active
+    __table_args__ = (
+        db.Index("ix_user_role_active", "role", "active"),
+        # partial index of just the active players (Postgres and SQLite)
+        db.Index(
+            "ix_user_active_players", "id",
+            # written the way SQLAlchemy renders active == True per dialect,
+            # so the planners can match the queries' predicates to it
+            postgresql_where=db.text("active = true AND role = 'player'"),
+            sqlite_where=db.text("active = 1 AND role = 'player'"),
+        ),
+    )
+
 # ---------------- MATCH STATS ----------------
 class Stats(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -35,6 +61,23 @@ class Stats(db.Model):
     # match type: BR / CS / Scrims / Custom
     match_type = db.Column(db.String(20))
 
+    player = db.relationship("User", back_populates="stats", lazy="select")
+
+    # per-player lookups (leaderboard, reports, history) filter on player_id,
+    # often with a date range or ordered by id
+    __table_args__ = (
+        # on Postgres the aggregated columns ride along for index-only scans
+        db.Index(
+            "ix_stats_player_date", "player_id", "date",
+            postgresql_include=["kills", "damage", "booyah", "survival", "position", "match_type"],
+        ),
+        db.Index("ix_stats_player_id", "player_id", "id"),
+        # typed leaderboard / report: player + match type, then date range
+        db.Index("ix_stats_player_type_date", "player_id", "match_type", "date"),
+        # shared-screenshot reference counts on proof delete
+        db.Index("ix_stats_screenshot", "screenshot"),
+    )
+
 # ---------------- ATTENDANCE ----------------
 class Attendance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -43,6 +86,11 @@ class Attendance(db.Model):
     date = db.Column(db.Date, nullable=False)
     status = db.Column(db.String(10))  # Present / Absent
 
+    # one attendance mark per player per day; also serves (player_id, date) lookups
+    __table_args__ = (
+        db.Index("ux_attendance_player_date", "player_id", "date", unique=True),
+    )
+
 # ---------------- ANNOUNCEMENTS ----------------
 class Announcement(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -52,13 +100,19 @@ class Announcement(db.Model):
     date = db.Column(db.String(20))
     active = db.Column(db.Boolean, default=True)
 
+    # latest active announcement: WHERE active ORDER BY id DESC LIMIT 1
+    __table_args__ = (
+        db.Index("ix_announcement_active_id", "active", "id"),
+    )
+
 
 # ---------------- ACTIVITY LOG (login, logout, attendance) ----------------
 class ActivityLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), index=True)
     username = db.Column(db.String(50), nullable=False)
     action = db.Column(db.String(30), nullable=False)  # login, logout, attendance_mark
+    # the log page pages by id (insert order), so no index on this
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __repr__(self):
@@ -69,4 +123,4 @@ class ActivityLog(db.Model):
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     message = db.Column(db.String(500), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
\ No newline at end of file